@@ -1,28 +1,82 @@
+import io
 import os
+import queue
 import shutil
-from typing import Optional
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import cache
+from itertools import repeat
+from typing import Iterator, Optional
 
-import psycopg2
 import hashlib
 
 from psycopg2.extensions import connection
+from psycopg2.pool import ThreadedConnectionPool
 from tinytag import TinyTag
 from getpass import getuser
 import argparse
 from datetime import datetime
 
-
-def get_db() -> connection:
-    # Initialize the database
-    username = getuser()
-    return psycopg2.connect(
+# Number of file_data rows buffered before they are flushed with COPY and committed
+BATCH_SIZE = 500
+
+# Columns loaded by copy_file_data, in row order, and the VARCHAR limits among them
+FILE_DATA_COLUMNS = (
+    'file_name', 'full_path', 'extension', 'song_title', 'album_name', 'album_artist', 'genre',
+    'year', 'duration', 'taggable', 'scan_name', 'sha256_hash', 'size', 'mtime',
+)
+FILE_DATA_VARCHAR_LIMITS = {
+    'file_name': 255,
+    'extension': 10,
+    'song_title': 255,
+    'album_name': 255,
+    'album_artist': 255,
+    'genre': 255,
+    'scan_name': 255,
+}
+
+# Characters escaped in COPY text format; NULL is written as \N, so empty strings
+# still load as ''
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+# Extensions (lowercase) of files that are never recorded by a scan
+SKIP_EXTENSIONS = frozenset({'plist', 'jpg'})
+
+# Number of files copied concurrently by copy_diff_files
+COPY_WORKERS = 8
+
+# Rows fetched per round trip from server-side cursors
+FETCH_SIZE = 2000
+
+
+@cache
+def get_pool() -> ThreadedConnectionPool:
+    # One pool per process, so connection parameters are resolved and
+    # connections are opened only once
+    return ThreadedConnectionPool(
+        1,
+        8,
         host="localhost",
         port=5432,
         dbname="postgres",
-        user=username
+        user=getuser()
     )
 
 
+@contextmanager
+def get_db() -> Iterator[connection]:
+    # Borrow a connection from the pool and hand it back when done
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
 def init_db(conn: connection) -> None:
     cur = conn.cursor()
 
@@ -42,9 +96,22 @@ def init_db(conn: connection) -> None:
         duration REAL,
         taggable BOOLEAN,
         scan_name VARCHAR(255),
-        sha256_hash TEXT
+        sha256_hash TEXT,
+        size BIGINT,
+        mtime DOUBLE PRECISION
     );
     """)
+    # Databases created before size/mtime were recorded
+    cur.execute("""
+    ALTER TABLE musician.file_data
+        ADD COLUMN IF NOT EXISTS size BIGINT,
+        ADD COLUMN IF NOT EXISTS mtime DOUBLE PRECISION;
+    """)
+    # Matches the join used by list_diff and copy_diff_files
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS file_data_scan_title_album_idx
+    ON musician.file_data (scan_name, COALESCE(song_title, file_name), COALESCE(album_name, ''));
+    """)
     cur.execute("""
     CREATE TABLE IF NOT EXISTS musician.scans (
         id SERIAL PRIMARY KEY,
@@ -63,159 +130,370 @@ def init_db(conn: connection) -> None:
 
 
 def calculate_sha256(file_path):
-    sha256 = hashlib.sha256()
+    # usedforsecurity=False keeps the OpenSSL-backed implementation (and its
+    # SHA-NI code path) available on FIPS-restricted builds; the hash is only
+    # used for duplicate detection.
     try:
         with open(file_path, 'rb') as f:
-            while chunk := f.read(4096):
-                sha256.update(chunk)
+            # file_digest reads into a preallocated buffer in C, with no Python-level loop
+            sha256 = hashlib.file_digest(f, lambda: hashlib.new('sha256', usedforsecurity=False))
         return sha256.hexdigest()
     except OSError as e:
         print(f"Could not hash {file_path}: {e}")
         return None
 
 
-def walk_and_record(conn: connection, path: str, scan_name: str):
+def copy_row(row: tuple) -> str:
+    # Format a file_data row as a line of COPY text format. Raises ValueError for
+    # values the server would reject, so the caller can count the file as an error
+    # instead of losing the whole batch.
+    fields = []
+    for column, value in zip(FILE_DATA_COLUMNS, row):
+        if value is None:
+            fields.append('\\N')
+            continue
+        if isinstance(value, str):
+            value.encode('utf-8')  # raises UnicodeEncodeError for undecodable file names
+            if '\x00' in value:
+                raise ValueError(f"{column} contains a NUL character")
+            limit = FILE_DATA_VARCHAR_LIMITS.get(column)
+            if limit is not None and len(value) > limit:
+                raise ValueError(f"{column} is longer than {limit} characters")
+        elif column == 'year' and not -2**31 <= value < 2**31:
+            raise ValueError(f"year {value} is out of range")
+        fields.append(str(value).translate(COPY_ESCAPES))
+    return '\t'.join(fields) + '\n'
+
+
+def copy_file_data(cur, buf: io.StringIO) -> None:
+    # Bulk load the buffered rows and reset the buffer for the next batch
+    buf.seek(0)
+    cur.copy_expert(f"""
+    COPY musician.file_data ({', '.join(FILE_DATA_COLUMNS)})
+    FROM STDIN
+    """, buf)
+    buf.seek(0)
+    buf.truncate(0)
+
+
+def iter_files(path: str):
+    # Recursively yield a DirEntry for every non-directory below path. Like
+    # os.walk, symlinked directories are not followed and unreadable
+    # directories are skipped.
+    try:
+        it = os.scandir(path)
+    except OSError as e:
+        print(f"Could not read directory {path}: {e}")
+        return
+    with it:
+        while True:
+            try:
+                entry = next(it)
+            except StopIteration:
+                break
+            except OSError as e:
+                print(f"Could not read directory {path}: {e}")
+                return
+
+            # As in os.walk, an entry that can't be inspected is treated as a
+            # file rather than a directory to descend into
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                yield entry
+                continue
+
+            try:
+                is_symlink = entry.is_symlink()
+            except OSError:
+                is_symlink = False
+            if not is_symlink:
+                yield from iter_files(entry.path)
+
+
+def parse_year(value: Optional[str]) -> Optional[int]:
+    # Year from a tag value such as '1999', '1999-04-01' or ' 1999 '; None if
+    # the value is missing or not a number
+    if not value:
+        return None
+    year_tag = value.partition('-')[0].replace(' ', '')
+    if not year_tag:
+        return None
+    try:
+        return int(year_tag)
+    except (ValueError, TypeError):
+        return None
+
+
+def process_file(full_path: str, sha256_hash: Optional[str] = None, hash_mode: str = 'all'):
+    # Hash and read tags for a single file. This runs in a worker process, so it
+    # stays at module level (picklable) and never touches the database. A hash
+    # already known from an earlier scan is passed through instead of re-reading
+    # the file. hash_mode is 'all', 'music' (taggable files only) or 'none'.
+    # Returns (sha256_hash, tags, taggable, error).
+    try:
+        # is_supported only checks the filename suffix, so it is the cheap gate in
+        # front of both hashing (for --hash music) and TinyTag.get
+        taggable = TinyTag.is_supported(full_path)
+        if hash_mode == 'none' or (hash_mode == 'music' and not taggable):
+            sha256_hash = None
+        elif sha256_hash is None:
+            sha256_hash = calculate_sha256(full_path)
+        tags = None
+        if taggable:
+            tag = TinyTag.get(full_path)
+
+            tags = {
+                'song_title': tag.title,
+                'album_name': tag.album,
+                'album_artist': tag.artist,
+                'genre': tag.genre,
+                'year': parse_year(tag.year),
+                'duration': tag.duration,
+            }
+        return sha256_hash, tags, taggable, None
+    except Exception as e:
+        return None, None, False, str(e)
+
+
+def hash_files(files: list, hash_mode: str, results: queue.Queue, stop: threading.Event) -> None:
+    # Producer for walk_and_record: hash and tag files across worker processes
+    # and queue (file, result) pairs in the order of files. A fatal
+    # error is queued for the consumer to re-raise, and None always marks the end.
+    try:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            paths = [file[1] for file in files]
+            known_hashes = [file[5] for file in files]
+            processed = executor.map(process_file, paths, known_hashes, repeat(hash_mode), chunksize=32)
+            for item in zip(files, processed):
+                if stop.is_set():
+                    break
+                results.put(item)
+            # Closing the map iterator cancels the files not yet started, so leaving
+            # the pool does not wait for them after a stop
+            processed.close()
+    except Exception as e:
+        results.put(e)
+    results.put(None)
+
+
+def walk_and_record(conn: connection, path: str, scan_name: str, hash_mode: str = 'all'):
     cur = conn.cursor()
 
-    # Check if scan_name already exists and stop early if it does
-    cur.execute("SELECT scan_name FROM musician.scans WHERE scan_name = %s;", (scan_name,))
-    if cur.fetchone():
-        print(f"Scan name {scan_name} already exists.")
-        return
+    # A scan can simply be rerun under a new name, so batch commits don't need to
+    # wait for the WAL flush
+    cur.execute("SET synchronous_commit TO OFF;")
+    try:
+        record_scan(conn, cur, path, scan_name, hash_mode)
+    finally:
+        # The connection goes back to the pool, so don't leave the setting behind
+        # for the next borrower. Anything uncommitted here belongs to a failed scan.
+        conn.rollback()
+        cur.execute("RESET synchronous_commit;")
+        conn.commit()
+        cur.close()
 
+
+def record_scan(conn: connection, cur, path: str, scan_name: str, hash_mode: str) -> None:
     # Initialize scan counters and start_time
     start_time = datetime.now()
     process_count = 0
     taggable_count = 0
     error_count = 0
 
+    # Claim scan_name before any file_data is committed under it, and stop early
+    # if it already exists
     cur.execute("""
     INSERT INTO musician.scans (scan_name, start_time)
     VALUES (%s, %s)
+    ON CONFLICT (scan_name) DO NOTHING
     """, (scan_name, start_time))
+    if cur.rowcount == 0:
+        conn.rollback()
+        print(f"Scan name {scan_name} already exists.")
+        return
+    conn.commit()
 
-    # Walk the directory and record file metadata
-    for dirpath, dirnames, filenames in os.walk(path):
-        for filename in filenames:
-            try:
-                full_path = os.path.join(dirpath, filename)
-                extension = os.path.splitext(filename)[1][1:]
-                if extension in {'plist', 'jpg'} or full_path.endswith('.DS_Store'):
+    # Hashes from earlier scans under this path, keyed by full_path. A file whose
+    # size and mtime are unchanged since then is not hashed again.
+    cur.execute("""
+    SELECT DISTINCT ON (full_path) full_path, size, mtime, sha256_hash
+    FROM musician.file_data
+    WHERE starts_with(full_path, %s)
+      AND size IS NOT NULL
+      AND sha256_hash IS NOT NULL
+    ORDER BY full_path, id DESC;
+    """, (path,))
+    known = {full_path: (size, mtime, sha256_hash) for full_path, size, mtime, sha256_hash in cur.fetchall()}
+
+    # Walk the directory and collect the files to record
+    files = []
+    for entry in iter_files(path):
+        filename = entry.name
+        # Same result as os.path.splitext: leading dots do not start an extension
+        base, dot, extension = filename.rpartition('.')
+        if not base.lstrip('.'):
+            extension = ''
+        if extension.lower() in SKIP_EXTENSIONS or filename == '.DS_Store':
+            continue
+
+        try:
+            st = entry.stat()
+            size, mtime = st.st_size, st.st_mtime
+        except OSError:
+            size = mtime = None
+        known_hash = None
+        prev = known.get(entry.path)
+        if prev and size is not None and prev[:2] == (size, mtime):
+            known_hash = prev[2]
+        files.append((filename, entry.path, extension, size, mtime, known_hash))
+
+    # Rows are accumulated in COPY text format and bulk loaded once per batch
+    buf = io.StringIO()
+
+    # A producer thread hashes and tags files while this thread loads the results,
+    # so disk/CPU work overlaps with COPY round trips
+    results = queue.Queue(maxsize=256)
+    stop = threading.Event()
+    producer = threading.Thread(target=hash_files, args=(files, hash_mode, results, stop))
+    producer.start()
+
+    try:
+        try:
+            while (item := results.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                (filename, full_path, extension, size, mtime, _), (sha256_hash, tags, taggable, error) = item
+                tags = tags or {}
+                if not error:
+                    try:
+                        line = copy_row((
+                            filename,
+                            full_path,
+                            extension,
+                            tags.get('song_title'),
+                            tags.get('album_name'),
+                            tags.get('album_artist'),
+                            tags.get('genre'),
+                            tags.get('year'),
+                            tags.get('duration'),
+                            taggable,
+                            scan_name,
+                            sha256_hash,
+                            size,
+                            mtime
+                        ))
+                    except ValueError as e:
+                        error = str(e)
+                if error:
+                    # Undecodable names can't be printed as-is either
+                    printable = filename.encode('utf-8', 'backslashreplace').decode('utf-8')
+                    print(f"Error processing {printable}: {error}")
+                    error_count += 1
                     continue
 
-                sha256_hash = calculate_sha256(full_path)
-                tag = None
-                taggable = TinyTag.is_supported(full_path)
                 if taggable:
-                    tag = TinyTag.get(full_path)
                     taggable_count += 1
+                buf.write(line)
 
-                year = None
-                if tag and tag.year:
-                    try:
-                        year_tag: str = tag.year.split('-')[0]
-                        if year_tag:
-                            year_tag = year_tag.replace(' ', '')
-                            year = int(year_tag)
-                    except (ValueError, TypeError):
-                        pass
-
-                cur.execute("""
-                INSERT INTO musician.file_data (file_name, full_path, extension, song_title, album_name, album_artist, genre, year, duration, taggable, scan_name, sha256_hash)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    filename,
-                    full_path,
-                    extension,
-                    tag.title if tag else None,
-                    tag.album if tag else None,
-                    tag.artist if tag else None,
-                    tag.genre if tag else None,
-                    year,
-                    tag.duration if tag else None,
-                    taggable,
-                    scan_name,
-                    sha256_hash
-                ))
-
-                conn.commit()
+                # Commit once per batch rather than once per file
                 process_count += 1
-                if process_count % 500 == 0:
+                if process_count % BATCH_SIZE == 0:
+                    copy_file_data(cur, buf)
+                    conn.commit()
                     print(f"{process_count} files processed.")
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
-                error_count += 1
+        except BaseException:
+            # Stop the producer and drain the queue so it is not left blocked on put
+            stop.set()
+            while results.get() is not None:
+                pass
+            raise
+        finally:
+            producer.join()
+
+        # Flush the final partial batch in the same transaction as the scan totals
+        if process_count % BATCH_SIZE:
+            copy_file_data(cur, buf)
+
+        end_time = datetime.now()
+        cur.execute("""
+        UPDATE musician.scans
+        SET end_time = %s, num_files = %s, num_taggable = %s, num_errors = %s
+        WHERE scan_name = %s
+        """, (end_time, process_count, taggable_count, error_count, scan_name))
+        conn.commit()
+
+        # Refresh planner statistics for the rows just loaded
+        cur.execute("ANALYZE musician.file_data;")
+        conn.commit()
+    except Exception:
+        # Discard the uncommitted batch before propagating the error
+        conn.rollback()
+        raise
 
-    end_time = datetime.now()
-    cur.execute("""
-    UPDATE musician.scans
-    SET end_time = %s, num_files = %s, num_taggable = %s, num_errors = %s
-    WHERE scan_name = %s
-    """, (end_time, process_count, taggable_count, error_count, scan_name))
-    conn.commit()
-
-    cur.close()
     print(
         f"Scan complete ({process_count} files, {taggable_count} taggable, {error_count} errors) for directory: {path}")
 
 
 def main():
-    if __name__ == '__main__':
-        # Create a top-level argument parser
-        parser = argparse.ArgumentParser(
-            description='A CLI tool to manage music files and populate metadata into a database.')
-
-        # Add sub-commands
-        subparsers = parser.add_subparsers(dest='command', help='Available commands')
-
-        # 'init_db' command
-        parser_init = subparsers.add_parser('init_db',
-                                            help='Initialize the database. This command requires no additional flags.')
-        parser_init.set_defaults(func=init_db)
-
-        # 'scan' command
-        parser_scan = subparsers.add_parser('scan',
-                                            help='Scan and populate metadata from a given music directory.')
-        parser_scan.add_argument('--path', required=True,
-                                 help='The absolute or relative path to the music directory to scan.')
-        parser_scan.add_argument('--scan-name', required=True,
-                                 help='A unique name for this scanning session for easier identification later.')
-        parser_scan.set_defaults(func=walk_and_record)
-
-        # 'exts' command
-        exts_parser = subparsers.add_parser('exts')
-        exts_parser.add_argument('--scan-name', help='Scan name to filter by')
-        exts_parser.set_defaults(func=list_extensions)
-
-        # 'list_file_data' command
-        list_file_data_parser = subparsers.add_parser('list_file_data')
-        list_file_data_parser.add_argument('--ext', required=True, help='File extension to filter by')
-        list_file_data_parser.add_argument('--limit', type=int, default=25, help='Limit the number of results')
-        list_file_data_parser.add_argument('--offset', type=int, default=0, help='Offset for the results')
-        list_file_data_parser.set_defaults(func=list_file_data)
-
-        # 'list_diff' command
-        list_diff_parser = subparsers.add_parser('list_diff')
-        list_diff_parser.add_argument('--origin-scan', required=True, help='Origin scan name')
-        list_diff_parser.add_argument('--dest-scan', required=True, help='Destination scan name')
-        list_diff_parser.set_defaults(func=list_diff)
-
-        # 'copy_diff_files' command
-        copy_diff_files_parser = subparsers.add_parser('copy_diff_files')
-        copy_diff_files_parser.add_argument('--origin-scan', required=True, help='Origin scan name')
-        copy_diff_files_parser.add_argument('--dest-scan', required=True, help='Destination scan name')
-        copy_diff_files_parser.add_argument('--folder-name', required=True, help='Folder name to copy files into')
-        copy_diff_files_parser.set_defaults(func=copy_diff_files)
-
-        args = parser.parse_args()
-
-        conn = get_db()
-
-        # Call the appropriate function based on the command
-        if args.command:
-            func_args = {k: v for k, v in vars(args).items() if k not in ('func', 'command')}
+    # Create a top-level argument parser
+    parser = argparse.ArgumentParser(
+        description='A CLI tool to manage music files and populate metadata into a database.')
+
+    # Add sub-commands
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+
+    # 'init_db' command
+    parser_init = subparsers.add_parser('init_db',
+                                        help='Initialize the database. This command requires no additional flags.')
+    parser_init.set_defaults(func=init_db)
+
+    # 'scan' command
+    parser_scan = subparsers.add_parser('scan',
+                                        help='Scan and populate metadata from a given music directory.')
+    parser_scan.add_argument('--path', required=True,
+                             help='The absolute or relative path to the music directory to scan.')
+    parser_scan.add_argument('--scan-name', required=True,
+                             help='A unique name for this scanning session for easier identification later.')
+    parser_scan.add_argument('--hash', dest='hash_mode', choices=('all', 'music', 'none'), default='all',
+                             help='Which files to SHA-256 hash: all files, only taggable music files, or none.')
+    parser_scan.set_defaults(func=walk_and_record)
+
+    # 'exts' command
+    exts_parser = subparsers.add_parser('exts')
+    exts_parser.add_argument('--scan-name', help='Scan name to filter by')
+    exts_parser.set_defaults(func=list_extensions)
+
+    # 'list_file_data' command
+    list_file_data_parser = subparsers.add_parser('list_file_data')
+    list_file_data_parser.add_argument('--ext', required=True, help='File extension to filter by')
+    list_file_data_parser.add_argument('--limit', type=int, default=25, help='Limit the number of results')
+    list_file_data_parser.add_argument('--offset', type=int, default=0, help='Offset for the results')
+    list_file_data_parser.set_defaults(func=list_file_data)
+
+    # 'list_diff' command
+    list_diff_parser = subparsers.add_parser('list_diff')
+    list_diff_parser.add_argument('--origin-scan', required=True, help='Origin scan name')
+    list_diff_parser.add_argument('--dest-scan', required=True, help='Destination scan name')
+    list_diff_parser.set_defaults(func=list_diff)
+
+    # 'copy_diff_files' command
+    copy_diff_files_parser = subparsers.add_parser('copy_diff_files')
+    copy_diff_files_parser.add_argument('--origin-scan', required=True, help='Origin scan name')
+    copy_diff_files_parser.add_argument('--dest-scan', required=True, help='Destination scan name')
+    copy_diff_files_parser.add_argument('--folder-name', required=True, help='Folder name to copy files into')
+    copy_diff_files_parser.set_defaults(func=copy_diff_files)
+
+    args = parser.parse_args()
+
+    # Call the appropriate function based on the command
+    if args.command:
+        func_args = {k: v for k, v in vars(args).items() if k not in ('func', 'command')}
+        with get_db() as conn:
             args.func(conn, **func_args)  # Pass the database connection and other arguments
-        conn.close()
+        get_pool().closeall()
 
 
 def list_extensions(conn: connection, scan_name: Optional[str] = None) -> None:
@@ -244,23 +522,21 @@ def list_extensions(conn: connection, scan_name: Optional[str] = None) -> None:
 
 
 def list_file_data(conn: connection, ext: str, limit: int = 25, offset: int = 0) -> None:
-    cur = conn.cursor()
-
-    # Execute modified SQL query
-    query = '''
-    SELECT *
-    FROM musician.file_data
-    WHERE extension = %s
-    ORDER BY file_name DESC
-    LIMIT %s OFFSET %s;
-    '''
-    cur.execute(query, (ext, limit, offset))
-    results = cur.fetchall()
-
-    # Display results
-    for row in results:
-        print("\t".join(str(col) for col in row))
-        print()
+    # Server-side cursor, so large limits are streamed rather than held in memory
+    with conn.cursor(name='list_file_data') as cur:
+        # Execute modified SQL query
+        query = '''
+        SELECT *
+        FROM musician.file_data
+        WHERE extension = %s
+        ORDER BY file_name DESC
+        LIMIT %s OFFSET %s;
+        '''
+        cur.execute(query, (ext, limit, offset))
+
+        # Display results, each row followed by a blank line, in one write per fetch
+        while results := cur.fetchmany(FETCH_SIZE):
+            sys.stdout.write(''.join("\t".join(map(str, row)) + "\n\n" for row in results))
 
 
 def list_diff(conn: connection, origin_scan: str, dest_scan: str) -> None:
@@ -270,7 +546,8 @@ def list_diff(conn: connection, origin_scan: str, dest_scan: str) -> None:
     SELECT count(origin.*)
     FROM musician.file_data origin
     LEFT JOIN musician.file_data dest
-      ON CONCAT(COALESCE(origin.song_title, origin.file_name), origin.album_name) = CONCAT(COALESCE(dest.song_title, dest.file_name), dest.album_name)
+      ON COALESCE(origin.song_title, origin.file_name) = COALESCE(dest.song_title, dest.file_name)
+      AND COALESCE(origin.album_name, '') = COALESCE(dest.album_name, '')
       AND dest.scan_name = %s
     WHERE origin.scan_name = %s
       AND dest.id IS NULL;
@@ -282,40 +559,56 @@ def list_diff(conn: connection, origin_scan: str, dest_scan: str) -> None:
     print(f"Different files count between {origin_scan} and {dest_scan}: {result}")
 
 
+def copy_file(source_path: str, dest_path: str) -> None:
+    # Copy the file if it exists in the source directory
+    if os.path.exists(source_path):
+        shutil.copy2(source_path, dest_path)
+    else:
+        print(f"File {source_path} not found in source directory")
+
+
+def copy_files(source_paths: list, dest_path: str) -> int:
+    # Copy files that share a basename one after another, so two threads never
+    # write the same destination file at once; the last copy wins as before
+    for source_path in source_paths:
+        copy_file(source_path, dest_path)
+    return len(source_paths)
+
+
 def copy_diff_files(conn: connection, origin_scan: str, dest_scan: str, folder_name: str) -> None:
-    cur = conn.cursor()
     os.makedirs(folder_name, exist_ok=True)
 
     query = '''
     SELECT origin.full_path
     FROM musician.file_data origin
     LEFT JOIN musician.file_data dest
-      ON CONCAT(COALESCE(origin.song_title, origin.file_name), origin.album_name) = CONCAT(COALESCE(dest.song_title, dest.file_name), dest.album_name)
+      ON COALESCE(origin.song_title, origin.file_name) = COALESCE(dest.song_title, dest.file_name)
+      AND COALESCE(origin.album_name, '') = COALESCE(dest.album_name, '')
       AND dest.scan_name = %s
     WHERE origin.scan_name = %s
       AND dest.id IS NULL;
     '''
-    cur.execute(query, (dest_scan, origin_scan))
-    results = cur.fetchall()
 
-    total_files = len(results)
     copied_files = 0
 
-    for source_path, in results:
-        dest_path = folder_name
-
-        # Copy the file if it exists in the source directory
-        if os.path.exists(source_path):
-            shutil.copy2(source_path, dest_path)
-        else:
-            print(f"File {source_path} not found in source directory")
-
-        copied_files += 1
-        if copied_files % 250 == 0:
-            percentage = (copied_files / total_files) * 100
-            print(f"{percentage:.2f}%: {copied_files} files out of {total_files} copied")
-
-    print(f"done: {copied_files} files out of {total_files} copied")
+    # Server-side cursor, so copying starts before the whole diff is fetched. The
+    # total isn't known up front, so progress is reported as a running count.
+    with conn.cursor(name='copy_diff_files') as cur, ThreadPoolExecutor(max_workers=COPY_WORKERS) as executor:
+        cur.execute(query, (dest_scan, origin_scan))
+        while results := cur.fetchmany(FETCH_SIZE):
+            # Everything is copied into one flat folder, so group by basename
+            by_name = defaultdict(list)
+            for source_path, in results:
+                by_name[os.path.basename(source_path)].append(source_path)
+
+            # Copy several groups at once to keep more than one IO request in flight
+            for count in executor.map(copy_files, by_name.values(), repeat(folder_name)):
+                previous = copied_files
+                copied_files += count
+                if copied_files // 250 > previous // 250:
+                    print(f"{copied_files} files copied")
+
+    print(f"done: {copied_files} files copied")
 
 
 if __name__ == '__main__':